@@ -4,14 +4,17 @@ import re
 
 import click
 from ghia.github_communicator import RequestException, GithubCommunicator
+from ghia.issue_shadow import IssueShadow
 
 
 class GHIASolver:
     ADD = 0
     REMOVE = 1
     LEAVE = 2
+    PENDING = 3
 
-    def __init__(self, config_auth, config_rules, reposlug, strategy="append", dry_run=False):
+    def __init__(self, config_auth, config_rules, reposlug, strategy="append", dry_run=False,
+                 shadow_ttl=60, shadow_path=None, communicator_class=GithubCommunicator):
         """
         Initializes the solver
 
@@ -25,6 +28,10 @@ class GHIASolver:
         :param reposlug: A string containing f"{repo_owner}/{repo_name}"
         :param strategy: What strategy is to be used options: "append", "set", "change"
         :param dry_run: boolean saying whether changes are to be persisted or not
+        :param shadow_ttl: seconds for which already sent changes are remembered, so they aren't sent again
+        :param shadow_path: optional path to a json file the remembered changes are persisted to, so they survive a restart.
+                            Only one process should use a given file, it is read once and then overwritten
+        :param communicator_class: what gets constructed to talk to github, swapped for a stub when replaying webhooks
         """
         self.reposlug = reposlug
         self.owner, self.repo = self.reposlug
@@ -34,7 +41,8 @@ class GHIASolver:
 
         self.token = config_auth["github"]["token"]
 
-        self.hubcom = GithubCommunicator(self.token, self.owner, self.repo)
+        self.hubcom = communicator_class(self.token, self.owner, self.repo)
+        self.shadow = IssueShadow(shadow_ttl, shadow_path)
 
         self.fallback_label = self.get_fallback_label()
         self.user_patterns = self.get_user_patterns()
@@ -105,18 +113,28 @@ class GHIASolver:
         else:
             return None
 
-    def update_users(self, action, user_list, issue_number):
+    def update_users(self, action, user_list, issue_number, reposlug):
         """
-        Makes the calls to update assignees
+        Makes the calls to update assignees, skipping the ones another run is already sending
 
         :param action: specifies what will be done with users in the user list. One of self.ADD REMOVE LEAVE
         :param user_list: list of strings - usernames, to be affected
         :param issue_number: an issue number to be affected
+        :param reposlug: tuple `(owner, reponame)` of the repo the issue is in
         :return:
         """
+        owner, repo = reposlug
         for username in user_list:
             if not self.dry_run:
-                self.hubcom.update_assignee(action, username, issue_number)
+                claim = self.shadow.claim_assignee(owner, repo, issue_number, action, username)
+                if claim is None:
+                    self.namedrop_assignee(self.PENDING, username)
+                    continue
+                try:
+                    self.hubcom.update_assignee(action, username, issue_number)
+                except Exception:
+                    self.shadow.forget_assignee(owner, repo, issue_number, username, claim)
+                    raise
                 self.namedrop_assignee(action, username)
             else:
                 self.namedrop_assignee(action, username)
@@ -147,7 +165,7 @@ class GHIASolver:
         """
         Writes a symbol indicating what action will be done and the username provided
 
-        :param action: one of `self.ADD self.REMOVE self.LEAVE`
+        :param action: one of `self.ADD self.REMOVE self.LEAVE self.PENDING`, pending means another run is already sending it
         :param username: the str username
         :return: nothing
         """
@@ -157,34 +175,42 @@ class GHIASolver:
             click.secho("   - ", nl=False, fg="red", bold=True)
         if action == self.LEAVE:
             click.secho("   = ", nl=False, fg="blue", bold=True)
+        if action == self.PENDING:
+            click.secho("   ~ ", nl=False, fg="yellow", bold=True)
+            click.echo(f"{username} (already being sent)")
+            return
         click.echo(username)
 
-    def assign_stuff_to_issue(self, issue):
+    def assign_stuff_to_issue(self, issue, reposlug=None):
         """
         Mom's spaghetti
         Figures out which users are already assigned, which are to be assigned and calls correct functions depending on the strategy configured
 
         :param issue: an issue json as retrieved from github
+        :param reposlug: tuple `(owner, reponame)` of the repo the issue is in, the configured one if None.
+                         The web app passes it in, another request can change the configured one meanwhile
         :return: nothing
         """
-        # ---- GET ASSIGNED USERS ----
+        if reposlug is None:
+            reposlug = self.reposlug
+        owner, repo = reposlug
 
-        sorted_assigned_users = [user["login"] for user in issue["assignees"]]
-        sorted_assigned_users.sort(key=str.casefold)
+        # ---- GET ASSIGNED USERS AND LABELS, INCLUDING CHANGES ALREADY SENT ----
 
-        assigned_users = set()
-        assigned_users.update(sorted_assigned_users)
+        assigned_users, issue_labels = self.shadow.reconcile(owner, repo, issue)
+
+        sorted_assigned_users = list(assigned_users)
+        sorted_assigned_users.sort(key=str.casefold)
 
         # ---- WRITE ISSUE NAME LINE
 
         click.secho("-> ", nl=False)
-        click.secho(f"{self.owner}/{self.repo}#{issue['number']} ", nl=False, bold=True)
+        click.secho(f"{owner}/{repo}#{issue['number']} ", nl=False, bold=True)
         click.secho(f"({issue['html_url']})")
 
         # ---- GET ASSIGNABLE USERS USING REGEXP ----
 
         assignable_users = set()
-        issue_labels = [label["name"] for label in issue["labels"]]
 
         for username, pattern_dict in self.user_patterns.items():
 
@@ -220,15 +246,15 @@ class GHIASolver:
 
         try:
             if self.strategy == "append":
-                self.update_users(self.ADD, sorted_addable_users, issue["number"])
+                self.update_users(self.ADD, sorted_addable_users, issue["number"], reposlug)
 
             elif self.strategy == "set":
                 if not assigned_users:
-                    self.update_users(self.ADD, sorted_addable_users, issue["number"])
+                    self.update_users(self.ADD, sorted_addable_users, issue["number"], reposlug)
 
             elif self.strategy == "change":
-                self.update_users(self.REMOVE, sorted_removable_users, issue["number"])
-                self.update_users(self.ADD, sorted_addable_users, issue["number"])
+                self.update_users(self.REMOVE, sorted_removable_users, issue["number"], reposlug)
+                self.update_users(self.ADD, sorted_addable_users, issue["number"], reposlug)
         except RequestException as e:
             pass
 
@@ -241,12 +267,16 @@ class GHIASolver:
                     self.write_fallback(f"already has label \"{self.fallback_label}\"")
                 else:
                     if not self.dry_run:
+                        claim = self.shadow.claim_label(owner, repo, issue["number"], self.fallback_label)
+                        if claim is None:
+                            self.write_fallback(f"already has label \"{self.fallback_label}\"")
+                            return
                         issue_labels.append(self.fallback_label)
                         try:
                             self.hubcom.set_issue_labels(issue, issue_labels)
                             self.write_fallback(f"added label \"{self.fallback_label}\"")
-                        except:
-                            pass
+                        except Exception:
+                            self.shadow.forget_label(owner, repo, issue["number"], self.fallback_label, claim)
                     else:
                         self.write_fallback(f"added label \"{self.fallback_label}\"")
 
@@ -0,0 +1,218 @@
+#!/bin/python
+import contextlib
+import functools
+import hashlib
+import hmac
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+
+from ghia.ghia_web import create_app
+from ghia.github_communicator import GithubCommunicator
+
+"""
+Pretends to be github so the web app can be hammered offline with recorded webhook deliveries
+"""
+class StubCommunicator(GithubCommunicator):
+
+    def __init__(self, token: str, owner: str, repo: str, latency=0.0):
+        """
+        Initializes the stub, no session is needed because nothing leaves the machine
+
+        :param token: ignored, kept so the solver can construct it like the real thing
+        :param owner: the username of the repo owner
+        :param repo: name of the repository
+        :param latency: seconds every pretend request to github takes
+        """
+        self.owner = owner
+        self.repo = repo
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls = {"update_assignee": 0, "set_issue_labels": 0}
+
+    def pretend_request(self, name: str):
+        """
+        Counts the call and waits as long as github would
+
+        :param name: name of the stubbed method
+        """
+        with self.lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_user_info(self):
+        """
+        :return: a made up user json, only the login is used
+        """
+        return {"login": "ghia-replay"}
+
+    def get_issue_list(self):
+        """
+        :return: an empty list, the replay only goes through webhooks
+        """
+        return []
+
+    def update_assignee(self, action: int, username: str, issue_number):
+        """
+        Counts the call instead of adding or removing an assignee
+        """
+        self.pretend_request("update_assignee")
+
+    def set_issue_labels(self, issue, issue_labels):
+        """
+        Counts the call instead of labeling the issue
+        """
+        self.pretend_request("set_issue_labels")
+
+
+def load_deliveries(path: str):
+    """
+    Loads deliveries recorded by the web app when GHIA_RECORD was set
+
+    :param path: path to the recorded file, one json object per line
+    :return: list of dicts with "headers" and "body"
+    """
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def sign_delivery(delivery, secret: str):
+    """
+    Replaces the signature of a delivery with one computed using the secret, the same way github does it
+
+    :param delivery: a delivery dict as loaded by `load_deliveries()`
+    :param secret: the webhook secret from the auth config file
+    :return: a new delivery dict with the signature header set
+    """
+    digester = hmac.new(bytes(secret, "UTF-8"), bytes(delivery["body"], "UTF-8"), hashlib.sha1)
+    headers = dict(delivery["headers"])
+    headers["X-Hub-Signature"] = "sha1=" + digester.hexdigest()
+    return {"headers": headers, "body": delivery["body"]}
+
+
+def percentile(sorted_values, fraction: float):
+    """
+    Picks the value below which the given fraction of values lies, nearest rank method
+
+    :param sorted_values: a sorted list of numbers, not empty
+    :param fraction: a number between 0 and 1, 0.99 for the 99th percentile
+    :return: the percentile value
+    """
+    index = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def replay(app, deliveries, concurrency=1, rate=0.0):
+    """
+    Sends the deliveries to the app through its test client and measures how long each one takes
+
+    With a rate set, deliveries are sent on a fixed schedule and the latency includes the time spent waiting for a free worker,
+    so an app that can't keep up shows it. Without one, every worker sends the next delivery as soon as it is done.
+
+    :param app: the flask app object
+    :param deliveries: list of delivery dicts as loaded by `load_deliveries()`
+    :param concurrency: number of deliveries in flight at once
+    :param rate: deliveries per second, 0 means as fast as possible
+    :return: a tuple (list of (status code, latency in seconds), total elapsed seconds)
+    """
+    local = threading.local()
+
+    def send(delivery, scheduled):
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        if scheduled is None:
+            scheduled = time.perf_counter()
+        try:
+            response = local.client.post("/", data=delivery["body"], headers=delivery["headers"])
+            status = response.status_code
+        except Exception:
+            status = None
+        return status, time.perf_counter() - scheduled
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = []
+        for number, delivery in enumerate(deliveries):
+            scheduled = None
+            if rate:
+                scheduled = started + number / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append(executor.submit(send, delivery, scheduled))
+        results = [future.result() for future in futures]
+    return results, time.perf_counter() - started
+
+
+def write_report(results, elapsed: float, hubcom):
+    """
+    Writes latency percentiles, throughput, error rate and how many changes the solver tried to make
+
+    :param results: list of (status code, latency in seconds) as returned by `replay()`
+    :param elapsed: total seconds the replay took
+    :param hubcom: the stub communicator used by the app, to read its call counts
+    """
+    latencies = sorted(latency for status, latency in results)
+    errors = {}
+    for status, latency in results:
+        if status != 200:
+            errors[status] = errors.get(status, 0) + 1
+    error_count = sum(errors.values())
+
+    click.secho("Deliveries: ", bold=True, nl=False)
+    click.echo(f"{len(results)} in {elapsed:.3f} s ({len(results) / elapsed:.1f}/s)")
+    click.secho("Latency:    ", bold=True, nl=False)
+    click.echo("  ".join(f"p{int(fraction * 100)} {percentile(latencies, fraction) * 1000:.2f} ms"
+                         for fraction in (0.5, 0.9, 0.99)) + f"  max {latencies[-1] * 1000:.2f} ms")
+    click.secho("Errors:     ", bold=True, nl=False)
+    click.echo(f"{error_count} ({error_count / len(results):.1%})", nl=not errors)
+    if errors:
+        click.echo(" " + ", ".join(f"{status}: {count}" for status, count in sorted(errors.items(), key=str)))
+    click.secho("GitHub:     ", bold=True, nl=False)
+    click.echo(", ".join(f"{name} {count}" for name, count in hubcom.calls.items()))
+
+
+@click.command()
+@click.option("-c", "--concurrency", default=1, show_default=True, type=click.IntRange(min=1),
+              help="Number of deliveries in flight at once.")
+@click.option("-r", "--rate", default=0.0, show_default=True, type=click.FloatRange(min=0),
+              help="Deliveries per second, 0 sends as fast as possible.")
+@click.option("-n", "--repeat", default=1, show_default=True, type=click.IntRange(min=1),
+              help="How many times to go through the recorded deliveries.")
+@click.option("-l", "--latency", default=0.0, show_default=True, type=click.FloatRange(min=0),
+              help="Seconds every stubbed GitHub request takes.")
+@click.option("--resign", is_flag=True,
+              help="Re-sign deliveries with the configured secret.")
+@click.argument("deliveries", type=click.Path(exists=True, dir_okay=False))
+def replay_cmd(concurrency, rate, repeat, latency, resign, deliveries):
+    """Replays recorded webhook deliveries against the web app with GitHub stubbed out
+
+    Configuration is taken from GHIA_CONFIG, the same as the web app does.
+    """
+    os.environ.pop("GHIA_RECORD", None)
+    app = create_app("replay", functools.partial(StubCommunicator, latency=latency), memory_shadow=True)
+
+    recorded = load_deliveries(deliveries)
+    if not recorded:
+        raise click.BadParameter("no deliveries recorded", param_hint="DELIVERIES")
+
+    if resign:
+        secret = app.config["auth"].get("secret", None)
+        if secret is None:
+            raise click.BadParameter("there is no secret in the auth config to sign with", param_hint="--resign")
+        recorded = [sign_delivery(delivery, secret) for delivery in recorded]
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results, elapsed = replay(app, recorded * repeat, concurrency, rate)
+
+    write_report(results, elapsed, app.config["ghia_solver"].hubcom)
+
+
+if __name__ == "__main__":
+    replay_cmd()
@@ -1,14 +1,17 @@
 #!/bin/python
 import configparser
+import threading
 
 import flask
 from flask import *
+import json
 import os
 import click
 import hashlib
 import hmac
 
 from ghia.ghia_cmd import GHIASolver
+from ghia.github_communicator import GithubCommunicator
 
 REACT_TO = {"opened", "edited", "transferred", "reopened", "assigned", "unassigned", "labeled", "unlabeled"}
 
@@ -30,6 +33,32 @@ def load_config(path: str):
     except FileNotFoundError:
         raise click.BadParameter("incorrect configuration format")
 
+class DeliveryRecorder:
+    RECORDED_HEADERS = {"content-type", "x-github-event", "x-github-delivery", "x-hub-signature"}
+
+    def __init__(self, path: str):
+        """
+        Records incoming webhook deliveries into a file, one json object per line, so they can be replayed later
+
+        :param path: path to the file the deliveries are appended to
+        """
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, headers, body: str):
+        """
+        Appends a delivery to the file, only the headers needed to process it again are kept.
+        Header names are compared case insensitively, werkzeug does not keep the casing github sends
+
+        :param headers: the headers of the received request
+        :param body: the raw body of the request, untouched so the signature still matches
+        """
+        delivery = {"headers": {name: value for name, value in headers.items() if name.lower() in self.RECORDED_HEADERS},
+                    "body": body}
+        with self.lock:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(delivery) + "\n")
+
 def react_to_hook(app, json_data):
     """
     Configures the solver according to github provided json_data and the app config, then calls the solver to analyze and modify the assignees on the specified issue
@@ -46,14 +75,22 @@ def react_to_hook(app, json_data):
 
     issue = json_data["issue"]
 
-    ghia_solver.assign_stuff_to_issue(issue)
+    ghia_solver.assign_stuff_to_issue(issue, reposlug)
 
-def create_app(some_argument):
+def create_app(some_argument, communicator_class=GithubCommunicator, memory_shadow=False):
     """
     Initializes the flask app with configfiles set in env variable
     GHIA_CONFIG - the paths to config files separated by ":" There are two files expected. rules and auth config file
+    GHIA_RECORD - optional path to a file every incoming webhook delivery gets appended to, for replaying it later
+
+    The flask config may set SHADOW_TTL - seconds sent changes are remembered for, and SHADOW_PATH - a file the
+    remembered changes are kept in over restarts. That file is for a single process only, several workers sharing
+    it would overwrite each other's changes
 
     :param some_argument: idk, but has to be there
+    :param communicator_class: what the solver uses to talk to github, the replay tool puts a stub in here
+    :param memory_shadow: ignore the configured SHADOW_PATH and keep the issue shadow in memory only,
+                          so a replay with a stubbed github doesn't leave its made up changes in the real file
     :return: the flask app object
     """
     app = flask.Flask(__name__)
@@ -81,7 +118,10 @@ def create_app(some_argument):
 
     app.config["auth"] = auth_configs[0]["github"]
 
-    ghia_solver = GHIASolver(auth_configs[0], rule_configs[0], ("foo", "bar"))
+    ghia_solver = GHIASolver(auth_configs[0], rule_configs[0], ("foo", "bar"),
+                             shadow_ttl=app.config.get("SHADOW_TTL", 60),
+                             shadow_path=None if memory_shadow else app.config.get("SHADOW_PATH", None),
+                             communicator_class=communicator_class)
     app.config["ghia_solver"] = ghia_solver
 
     user_patterns = ghia_solver.get_user_patterns()
@@ -96,6 +136,9 @@ def create_app(some_argument):
 
     app.config["user_info"] = user_info
 
+    record_path = os.environ.get("GHIA_RECORD", default=None)
+    recorder = DeliveryRecorder(record_path) if record_path is not None else None
+
     @app.route("/", methods=["GET"])
     def index():
         """
@@ -115,6 +158,13 @@ def create_app(some_argument):
 
         :return: Flask app object
         """
+        if recorder is not None:
+            try:
+                recorder.record(request.headers, request.get_data(as_text=True))
+            except OSError as e:
+                click.secho("WARNING: ", bold=True, nl=False, fg="yellow", err=True)
+                click.secho(f"Could not record delivery to {recorder.path} ({e})", err=True)
+
         try:
             if secret is not None:
                 received_signature = request.headers['X-Hub-Signature'].split("sha1=")[1]
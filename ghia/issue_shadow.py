@@ -0,0 +1,249 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+import click
+
+"""
+Keeps a local idea of what the solver already told github to do with an issue, so it doesn't tell it twice
+"""
+class IssueShadow:
+    ADD = 0
+    REMOVE = 1
+
+    def __init__(self, ttl=60, path=None):
+        """
+        Initializes an empty shadow, or loads one from a file if a path is given
+
+        Every mutation is remembered as pending until the fetched issue json confirms it or until it expires.
+        While pending, it is layered over whatever github sends, because that json might have been
+        fetched before the mutation landed.
+
+        :param ttl: number of seconds a remembered mutation stays valid
+        :param path: optional path to a json file the shadow is persisted to, None keeps it in memory only.
+                     The file is read only here, so it carries the shadow over restarts of a single process,
+                     it is not a way to share it between several processes
+        """
+        self.ttl = ttl
+        self.path = path
+        self.lock = threading.Lock()
+        self.issues = {}
+
+        if self.path is not None:
+            self.load()
+
+    def get_key(self, owner, repo, issue_number):
+        """
+        Makes a key under which the issue is stored, the solver switches repos in the web app so the number is not enough
+
+        :return: string in the f"{owner}/{repo}#{issue_number}" format
+        """
+        return f"{owner}/{repo}#{issue_number}"
+
+    def get_entry(self, key):
+        """
+        Gets the shadow entry for an issue, creates an empty one if there is none
+
+        :param key: key made by `get_key()`
+        :return: dict with "assignees" - {username: [action, timestamp]} and "labels" - {label: timestamp}
+        """
+        return self.issues.setdefault(key, {"assignees": {}, "labels": {}})
+
+    def expire(self, now):
+        """
+        Forgets expired mutations of all issues, not just the one being worked on, so closed issues don't pile up.
+        Expects the lock to be held
+
+        :param now: current time as returned by `time.time()`
+        :return: boolean saying whether anything was forgotten
+        """
+        changed = False
+        for key, entry in list(self.issues.items()):
+            for username, (action, timestamp) in list(entry["assignees"].items()):
+                if now - timestamp > self.ttl:
+                    del entry["assignees"][username]
+                    changed = True
+
+            for label, timestamp in list(entry["labels"].items()):
+                if now - timestamp > self.ttl:
+                    del entry["labels"][label]
+                    changed = True
+
+            if not entry["assignees"] and not entry["labels"]:
+                del self.issues[key]
+                changed = True
+        return changed
+
+    def reconcile(self, owner, repo, issue):
+        """
+        Merges the fetched issue json with the pending mutations. Expired mutations and the ones
+        the fetched json already reflects are forgotten
+
+        :param owner: the username of the repo owner
+        :param repo: name of the repository
+        :param issue: an issue json as retrieved from github
+        :return: a tuple of (set of assignee usernames, list of label names) as they should be once everything lands
+        """
+        assignees = {user["login"] for user in issue["assignees"]}
+        labels = [label["name"] for label in issue["labels"]]
+
+        key = self.get_key(owner, repo, issue["number"])
+
+        with self.lock:
+            changed = self.expire(time.time())
+
+            entry = self.issues.get(key)
+            if entry is not None:
+                for username, (action, timestamp) in list(entry["assignees"].items()):
+                    if (username in assignees) == (action == self.ADD):
+                        del entry["assignees"][username]
+                        changed = True
+                    elif action == self.ADD:
+                        assignees.add(username)
+                    else:
+                        assignees.discard(username)
+
+                for label in list(entry["labels"]):
+                    if label in labels:
+                        del entry["labels"][label]
+                        changed = True
+                    else:
+                        labels.append(label)
+
+                if not entry["assignees"] and not entry["labels"]:
+                    del self.issues[key]
+
+            if changed:
+                self.save()
+
+        return assignees, labels
+
+    def claim_assignee(self, owner, repo, issue_number, action, username):
+        """
+        Checks that the same mutation is not pending already and remembers it as pending, all at once,
+        so two runs working on the same issue can't both send it. Call before the request goes out
+
+        :param action: one of `self.ADD self.REMOVE`
+        :param username: username being assigned or removed
+        :return: the claimed `[action, timestamp]` to hand to `forget_assignee()` if sending fails,
+                 None if the same mutation is already pending and the caller should not send it
+        """
+        with self.lock:
+            now = time.time()
+            self.expire(now)
+            entry = self.get_entry(self.get_key(owner, repo, issue_number))
+            pending = entry["assignees"].get(username)
+            if pending is not None and pending[0] == action:
+                return None
+            claim = [action, now]
+            entry["assignees"][username] = claim
+            self.save()
+            return claim
+
+    def forget_assignee(self, owner, repo, issue_number, username, claim):
+        """
+        Rolls back a pending assignee mutation, for when sending it failed.
+        Does nothing if another run claimed something else for the user meanwhile
+
+        :param username: username whose mutation failed
+        :param claim: what `claim_assignee()` returned
+        """
+        with self.lock:
+            key = self.get_key(owner, repo, issue_number)
+            if key in self.issues and self.issues[key]["assignees"].get(username) == claim:
+                del self.issues[key]["assignees"][username]
+                self.save()
+
+    def claim_label(self, owner, repo, issue_number, label):
+        """
+        Same as `claim_assignee()`, but for a label being put on an issue
+
+        :param label: name of the label
+        :return: the claimed timestamp to hand to `forget_label()` if sending fails,
+                 None if the label is already pending and the caller should not send it
+        """
+        with self.lock:
+            now = time.time()
+            self.expire(now)
+            entry = self.get_entry(self.get_key(owner, repo, issue_number))
+            if label in entry["labels"]:
+                return None
+            entry["labels"][label] = now
+            self.save()
+            return now
+
+    def forget_label(self, owner, repo, issue_number, label, claim):
+        """
+        Rolls back a pending label, for when sending it failed.
+        Does nothing if another run claimed the label again meanwhile
+
+        :param label: name of the label that did not make it
+        :param claim: what `claim_label()` returned
+        """
+        with self.lock:
+            key = self.get_key(owner, repo, issue_number)
+            if key in self.issues and self.issues[key]["labels"].get(label) == claim:
+                del self.issues[key]["labels"][label]
+                self.save()
+
+    # ----Persistence----
+
+    def is_valid_entry(self, entry):
+        """
+        Checks that an entry loaded from the file looks like one made by `get_entry()`
+
+        :param entry: whatever was stored under an issue key
+        :return: boolean saying whether the entry can be used
+        """
+        if not isinstance(entry, dict) or set(entry) != {"assignees", "labels"}:
+            return False
+        if not isinstance(entry["assignees"], dict) or not isinstance(entry["labels"], dict):
+            return False
+        for pending in entry["assignees"].values():
+            if not (isinstance(pending, list) and len(pending) == 2 and pending[0] in (self.ADD, self.REMOVE) and
+                    isinstance(pending[1], (int, float))):
+                return False
+        return all(isinstance(timestamp, (int, float)) for timestamp in entry["labels"].values())
+
+    def load(self):
+        """
+        Loads the shadow from the configured file. A missing file means an empty shadow,
+        so does an unreadable one, it only remembers things for a while anyway
+        """
+        try:
+            with open(self.path) as file:
+                issues = json.load(file)
+            if not isinstance(issues, dict):
+                raise ValueError("not a json object")
+            if not all(self.is_valid_entry(entry) for entry in issues.values()):
+                raise ValueError("unexpected entry format")
+            self.issues = issues
+        except FileNotFoundError:
+            self.issues = {}
+        except (OSError, ValueError) as e:
+            click.secho("WARNING: ", bold=True, nl=False, fg="yellow", err=True)
+            click.secho(f"Could not load issue shadow from {self.path}, starting empty ({e})", err=True)
+            self.issues = {}
+
+    def save(self):
+        """
+        Writes the shadow to the configured file, does nothing when kept in memory only. Expects the lock to be held.
+        The file is written next to the real one and then swapped in, so a crash midway can't leave half of it behind.
+        Like loading, this is best effort, a file that can't be written only gets a warning and the shadow stays in memory
+        """
+        if self.path is None:
+            return
+        temp_path = None
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".shadow-", suffix=".json")
+            with os.fdopen(fd, "w") as file:
+                json.dump(self.issues, file)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.unlink(temp_path)
+            click.secho("WARNING: ", bold=True, nl=False, fg="yellow", err=True)
+            click.secho(f"Could not save issue shadow to {self.path} ({e})", err=True)
@@ -33,6 +33,7 @@ setuptools.setup(
     entry_points={
         'console_scripts': [
             'ghia = ghia.ghia_cmd:ghia_cmd',
+            'ghia-replay = ghia.ghia_replay:replay_cmd',
         ],
     },
     install_requires=['Flask', 'click', 'requests'],